@@ -1,7 +1,9 @@
 """ psychoacoustics exports classes for handling psychophysical procedures and
 measures, like trial sequences and staircases."""
 
+import array
 import io
+import math
 import pathlib
 import datetime
 import json
@@ -11,20 +13,69 @@ import collections
 from contextlib import contextmanager
 from abc import abstractmethod
 import warnings
-import matplotlib.cbook # necessary for matplotlib versions <3.5 to suppress a MatplotlibDeprecationWarning
+import numpy
 try:
-    import curses
+    import orjson  # fast JSON implementation, used instead of the stdlib json if available
 except ImportError:
-    curses = None
-import numpy
+    orjson = None
 try:
-    import matplotlib.pyplot as plt
+    import msgpack  # optional compact binary serialization format
 except ImportError:
-    plt = None
+    msgpack = None
+try:
+    import numba  # optional, compiles the staircase simulation kernel to native code
+except ImportError:
+    numba = None
 import slab
 
+
+_plt = None  # memoized matplotlib.pyplot module, filled in by the first successful _get_plt call
+
+
+def _get_plt():
+    """ Import and return matplotlib.pyplot, or None if matplotlib is not installed. Deferred to the call sites
+    so that importing the module stays fast and light for scripts that run trial sequences without plotting. """
+    global _plt
+    if _plt is not None:
+        return _plt
+    try:
+        import matplotlib.cbook  # necessary for matplotlib versions <3.5 to suppress a MatplotlibDeprecationWarning
+        with warnings.catch_warnings():  # the attribute access itself warns on matplotlib >= 3.6
+            warnings.simplefilter('ignore')
+            deprecation_warning = getattr(matplotlib.cbook, 'MatplotlibDeprecationWarning', None)
+        if deprecation_warning is not None:
+            warnings.filterwarnings("ignore", category=deprecation_warning)
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return None
+    _plt = plt
+    return _plt
+
 results_folder = 'Results'
 input_method = 'keyboard'  #: sets the input for the Key context manager to 'keyboard 'or 'buttonbox'
+_rng = numpy.random.default_rng()  # module-wide random generator; PCG64 is faster than the legacy global state
+
+
+def _json_default(obj):
+    """ Conversion helper so that numpy types and compact int arrays serialize to JSON. """
+    if isinstance(obj, (numpy.ndarray, array.array)):
+        return obj.tolist()
+    return int(obj) if isinstance(obj, numpy.int64) else obj
+
+
+def _has_nonfinite(obj):
+    """ Check recursively whether obj contains non-finite floats (inf or nan). orjson cannot round-trip
+    those: it writes them as null and rejects the Infinity/NaN literals the stdlib json module produces,
+    so saving falls back to the stdlib for objects containing them (e.g. staircases without min/max). """
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, numpy.ndarray):
+        return obj.dtype.kind == 'f' and not numpy.isfinite(obj).all()
+    if isinstance(obj, dict):
+        return any(_has_nonfinite(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_nonfinite(value) for value in obj)
+    return False
 
 
 class _Buttonbox:
@@ -47,10 +98,9 @@ class _FigChar:
     already present. If used together with the plot method of the Staircase class, input is acquired through the stairs
     plot. Depending on the operating system, you may have to click once into the figure to give it focus.
     """
-    warnings.filterwarnings("ignore", category=matplotlib.cbook.MatplotlibDeprecationWarning)
-
     @staticmethod
     def getch():
+        plt = _get_plt()
         global key
         def _on_key(event):
             global key
@@ -76,7 +126,9 @@ def key():
     """
 
     if input_method == 'keyboard':
-        if curses is None:
+        try:
+            import curses
+        except ImportError:
             raise ImportError(
                 'You need curses to use the keypress class (pip install curses (or windows-curses))')
         curses.filter()
@@ -96,7 +148,20 @@ def key():
 
 
 class LoadSaveMixin:
-    """ Mixin to provide loading and saving functions. Supports JSON the pickle format """
+    """ Mixin to provide loading and saving functions. Supports the JSON, msgpack and pickle format """
+
+    _transient = ()  # attribute names excluded from saved files because _after_load rebuilds them
+
+    def _save_dict(self):
+        """ Return the instance dict without transient attributes (derived state which would bloat the
+        files and which `_after_load` rebuilds anyway). """
+        if not self._transient:
+            return self.__dict__
+        return {key: value for key, value in self.__dict__.items() if key not in self._transient}
+
+    def _after_load(self):
+        """ Hook called after deserialization has replaced `self.__dict__`. Subclasses override it to rebuild
+        derived state which is not (or not in the right form) contained in saved files. """
 
     def save_pickle(self, file_name, clobber=False):
         """
@@ -113,7 +178,7 @@ class LoadSaveMixin:
         if pathlib.Path(file_name).exists() and not clobber:
             raise FileExistsError("Select clobber=True to overwrite.")
         with open(file_name, 'wb') as fp:
-            pickle.dump(self.__dict__, fp, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(self._save_dict(), fp, protocol=pickle.HIGHEST_PROTOCOL)
             return True
 
     def load_pickle(self, file_name):
@@ -127,6 +192,7 @@ class LoadSaveMixin:
             file_name = str(file_name)
         with open(file_name, 'rb') as fp:
             self.__dict__ = pickle.load(fp)
+        self._after_load()
 
     def save_json(self, file_name=None, clobber=False):
         """
@@ -138,17 +204,26 @@ class LoadSaveMixin:
         Returns:
             (bool): True if writing was successful.
         """
-        def default(i): return int(i) if isinstance(i, numpy.int64) else i  # helper for converting numpy arrays
         if isinstance(file_name, pathlib.Path):
             file_name = str(file_name)
+        saved = self._save_dict()
+        use_orjson = orjson is not None and not _has_nonfinite(saved)
         if (file_name is None) or (file_name == 'stdout'):
-            return json.dumps(self.__dict__, indent=2, default=default)
+            if use_orjson:
+                return orjson.dumps(saved, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY,
+                                    default=_json_default).decode()
+            return json.dumps(saved, indent=2, default=_json_default)
         if pathlib.Path(file_name).exists() and not clobber:
             raise FileExistsError("Select clobber=True to overwrite.")
         try:
-            with open(file_name, 'w') as f:
-                json.dump(self.__dict__, f, indent=2, default=default)
-                return True
+            if use_orjson:  # orjson serializes numpy types directly and is much faster for long sequences
+                with open(file_name, 'wb') as f:
+                    f.write(orjson.dumps(saved, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY,
+                                         default=_json_default))
+            else:
+                with open(file_name, 'w') as f:
+                    json.dump(saved, f, indent=2, default=_json_default)
+            return True
         except (TypeError, ValueError):  # type error caused by json dump, value error by default function
             print("Your sequence contains data which is not JSON serializable, use the save_pickle method instead.")
 
@@ -161,8 +236,59 @@ class LoadSaveMixin:
         """
         if isinstance(file_name, pathlib.Path):
             file_name = str(file_name)
-        with open(file_name, 'r') as f:
-            self.__dict__ = json.load(f)
+        with open(file_name, 'rb') as f:
+            content = f.read()
+        if orjson is not None:
+            try:
+                self.__dict__ = orjson.loads(content)
+            except orjson.JSONDecodeError:  # e.g. Infinity literals, which only the stdlib module accepts
+                self.__dict__ = json.loads(content)
+        else:
+            self.__dict__ = json.loads(content)
+        self._after_load()
+
+
+    def save_msgpack(self, file_name, clobber=False):
+        """
+        Save the object as msgpack file. Msgpack is a compact binary format which writes and reads much faster
+        than JSON and produces smaller files, which makes it well suited for repeatedly checkpointing a sequence
+        during long experiments. Requires the optional `msgpack` module.
+
+        Arguments:
+            file_name (str | pathlib.Path): name of the file to create.
+            clobber (bool): overwrite existing file with the same name, defaults to False.
+        Returns:
+            (bool): True if writing was successful.
+        """
+        if msgpack is None:
+            raise ImportError('Saving as msgpack requires the msgpack module (pip install msgpack).')
+        def default(obj):
+            return obj.tolist() if isinstance(obj, (numpy.ndarray, numpy.generic, array.array)) else obj
+        if isinstance(file_name, pathlib.Path):
+            file_name = str(file_name)
+        if pathlib.Path(file_name).exists() and not clobber:
+            raise FileExistsError("Select clobber=True to overwrite.")
+        try:
+            with open(file_name, 'wb') as f:
+                f.write(msgpack.packb(self._save_dict(), use_bin_type=True, default=default))
+            return True
+        except TypeError:
+            print("Your sequence contains data which is not msgpack serializable, use the save_pickle method instead.")
+
+    def load_msgpack(self, file_name):
+        """
+        Read msgpack file and deserialize the object into `self.__dict__`.
+
+        Attributes:
+            file_name (str | pathlib.Path): name of the file to read.
+        """
+        if msgpack is None:
+            raise ImportError('Loading msgpack files requires the msgpack module (pip install msgpack).')
+        if isinstance(file_name, pathlib.Path):
+            file_name = str(file_name)
+        with open(file_name, 'rb') as f:
+            self.__dict__ = msgpack.unpackb(f.read(), raw=False)
+        self._after_load()
 
 
 class TrialPresentationOptionsMixin:
@@ -198,7 +324,8 @@ class TrialPresentationOptionsMixin:
             stims = [target] + distractors  # assuming sound object and list of sounds
         else:
             stims = [target, distractors]  # assuming two sound objects
-        order = numpy.random.permutation(len(stims))
+        plt = _get_plt()
+        order = _rng.permutation(len(stims))
         for idx in order:
             stim = stims[idx]
             stim.play()
@@ -266,10 +393,10 @@ class TrialPresentationOptionsMixin:
                 hitrate = hitrates[current_condition]
             else:
                 hitrate = hitrates
-        hit = numpy.random.rand() < hitrate  # True with probability hitrate
+        hit = _rng.random() < hitrate  # True with probability hitrate
         if hit or intervals == 1:
             return hit
-        return numpy.random.rand() < 1/intervals  # still 1/intervals chance to hit the right interval
+        return _rng.random() < 1/intervals  # still 1/intervals chance to hit the right interval
 
 
 class Trialsequence(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOptionsMixin):
@@ -311,6 +438,9 @@ class Trialsequence(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOp
             list of empty lists. Then , one can use the `add_response` method to append to the list belonging to the
             current trial
     """
+
+    _transient = ('_resolved_trials', '_repr_cache')  # derived state, rebuilt instead of saved
+
     def __init__(self, conditions=2, n_reps=1, trials=None, kind=None, deviant_freq=None, label=''):
         self.label = label
         self.n_reps = int(n_reps)
@@ -364,8 +494,9 @@ class Trialsequence(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOp
                             trials[t] = i + 1
                 self.trials = trials
                 self.n_conditions = len(self.conditions)
-            if isinstance(self.trials, numpy.ndarray):
-                self.trials = self.trials.tolist()  # convert trials to list
+            # store trials as a compact int array - list-like, but far smaller and cache-friendly for the
+            # vectorized methods (transitions, condition_probabilities) which read it via the buffer protocol
+            self.trials = array.array('i', self.trials)
             self.this_n = -1  # trial index in entire sequence
             self.this_trial = []  # condition of current trial
             self.finished = False
@@ -374,9 +505,29 @@ class Trialsequence(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOp
             self.n_remaining = self.n_trials
             self.kind = kind
             self.data = [[] for _ in self.trials]
+            self._resolve_trials()
+        self._repr_cache = (None, None)  # (key, string) of the last __repr__ call
 
     def __repr__(self):
-        return self.__dict__.__repr__()
+        # building the string is O(n_trials), so cache it for repeated calls (frequent in interactive sessions)
+        key = (len(self.trials), self.this_n, self.finished)
+        cached_key, cached_string = getattr(self, '_repr_cache', (None, None))
+        if key == cached_key:
+            return cached_string
+        string = {k: v for k, v in self.__dict__.items() if k not in self._transient}.__repr__()
+        self._repr_cache = (key, string)
+        return string
+
+    def _resolve_trials(self):
+        """ Precompute the condition of every entry in `trials`, partially evaluating the per-trial deviant
+        check and conditions lookup, so that advancing the sequence is a single table access. """
+        self._resolved_trials = [0 if i == 0 else self.conditions[i-1] for i in self.trials]
+
+    def _after_load(self):
+        """ Rebuild the transient attributes, which save_* methods do not write to file (runs for both the
+        constructor's file argument and direct load_* calls). """
+        self._resolve_trials()
+        self._repr_cache = (None, None)
 
     def __str__(self):
         return f'Trialsequence, trials {"inf" if self.kind=="infinite" else self.n_trials}, ' \
@@ -389,25 +540,28 @@ class Trialsequence(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOp
         Returns:
              (int): current element of the list in `trials`
         """
-        self.this_n += 1
-        self.n_remaining -= 1
-        if self.n_remaining < 0:  # all trials complete
-            if self.kind == 'infinite':  # finite sequence -> reset and start again
+        if self.finished:
+            raise StopIteration
+        if self.n_remaining <= 0:  # all trials complete
+            if self.kind == 'infinite':  # infinite sequence -> reset and start again
                 # new sequence, avoid start with previous condition
-                self.trials = self._create_simple_sequence(len(self.conditions), self.n_reps,
-                                                           dont_start_with=self.trials[-1])
+                self.trials = array.array('i', self._create_simple_sequence(len(self.conditions), self.n_reps,
+                                                                            dont_start_with=self.trials[-1]))
+                self._resolve_trials()
                 self.this_n = 0
                 self.n_remaining = self.n_trials - 1  # reset trial countdown to length of new trial
                 #  sequence (subtract 1 because we return the 0th trial below)
+                self._repr_cache = (None, None)  # trials changed, invalidate cached __repr__ string
             else:  # finite sequence -> finish
+                self.this_n += 1  # advance past the last trial so this_n equals the number of completed trials
+                self.n_remaining -= 1
                 self.this_trial = []
                 self.finished = True
-        if self.finished:
-            raise StopIteration
-        if self.trials[self.this_n] == 0:
-            self.this_trial = 0
+                raise StopIteration
         else:
-            self.this_trial = self.conditions[self.trials[self.this_n]-1]  # fetch the trial info
+            self.this_n += 1
+            self.n_remaining -= 1
+        self.this_trial = self._resolved_trials[self.this_n]  # fetch the precomputed trial info
         return self.this_trial
 
     def add_response(self, response):
@@ -422,6 +576,7 @@ class Trialsequence(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOp
             print("Can't add response because trial hasn't started yet!")
         else:
             self.data[self.this_n].append(response)
+            self._repr_cache = (None, None)  # data changed, invalidate cached __repr__ string
 
     def print_trial_info(self):
         """ Convenience method for printing current trial information. """
@@ -445,20 +600,15 @@ class Trialsequence(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOp
             (numpy.ndarray): randomized sequence of length n_conditions * n_reps without direct repetitions of any
             element.
         """
-        permute = list(range(1, n_conditions+1))
+        # shuffle all repetitions at once, then fix up rows that would repeat the last element of the previous row
+        trials = _rng.permuted(numpy.tile(numpy.arange(1, n_conditions+1), (n_reps, 1)), axis=1)
         if dont_start_with is not None:
-            trials = [dont_start_with]
-        else:
-            trials = []
-        for _ in range(n_reps):
-            numpy.random.shuffle(permute)
-            if len(trials) > 0:
-                while trials[-1] == permute[0]:
-                    numpy.random.shuffle(permute)
-            trials += permute
-        if dont_start_with is not None: # delete first entry ('dont_start_with')
-            trials = trials[1:]
-        return numpy.array(trials)
+            while trials[0, 0] == dont_start_with:
+                trials[0] = _rng.permutation(trials[0])
+        for rep in range(1, n_reps):
+            while trials[rep, 0] == trials[rep-1, -1]:
+                trials[rep] = _rng.permutation(trials[rep])
+        return trials.ravel()
 
     @staticmethod
     def _deviant_indices(n_standard, deviant_freq=.1):
@@ -481,16 +631,13 @@ class Trialsequence(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOp
             min_dist = 1
         else:
             raise ValueError("Deviant frequency can't be greater than 0.3!")
-        # get the possible combinations of deviants and normal trials:
         n_deviants = int(n_standard*deviant_freq)
-        indices = range(n_standard)
-        deviant_indices = numpy.random.choice(indices, n_deviants, replace=False)
+        # draw indices from a range shrunk by the minimum gaps and spread them back out by min_dist-1 each.
+        # This samples directly from the sequences satisfying the distance constraint instead of
+        # re-drawing until a valid one comes up, which could loop for a long time at high deviant rates.
+        deviant_indices = _rng.choice(n_standard - (n_deviants-1)*(min_dist-1), n_deviants, replace=False)
         deviant_indices.sort()
-        dist = numpy.diff(deviant_indices)
-        while numpy.min(dist) < min_dist:  # reshuffle until minimum distance is satisfied
-            deviant_indices = numpy.random.choice(indices, n_deviants, replace=False)
-            deviant_indices.sort()
-            dist = numpy.diff(deviant_indices)
+        deviant_indices += numpy.arange(n_deviants) * (min_dist-1)
         return deviant_indices
 
     @staticmethod
@@ -505,7 +652,7 @@ class Trialsequence(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOp
         Returns:
             (numpy.ndarray): randomized sequence.
         """
-        return numpy.random.permutation(numpy.tile(list(range(1, n_conditions+1)), n_reps))
+        return _rng.permutation(numpy.tile(list(range(1, n_conditions+1)), n_reps))
 
     def get_future_trial(self, n=1):
         """
@@ -531,9 +678,9 @@ class Trialsequence(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOp
             number of transitions from condition 1 to condition 3. If the `kind` of the sequence is "non_repeating",
             the diagonal is 0 because no condition transitions into itself.
         """
+        t = numpy.asarray(self.trials, dtype=numpy.intp) - 1
         transitions = numpy.zeros((self.n_conditions, self.n_conditions))
-        for i, j in zip(self.trials, self.trials[1:]):
-            transitions[i-1, j-1] += 1
+        numpy.add.at(transitions, (t[:-1], t[1:]), 1)  # count all transitions in one C-level pass
         return transitions
 
     def condition_probabilities(self):
@@ -544,12 +691,9 @@ class Trialsequence(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOp
              (list): list of floats floats, where every element represents the frequency of one condition.
                 The fist element is the frequency of the first condition and so on.
         """
-        probabilities = []
-        for i in range(self.n_conditions):
-            num = self.trials.count(i)
-            num /= self.n_trials
-            probabilities.append(num)
-        return probabilities
+        counts = numpy.bincount(numpy.asarray(self.trials, dtype=numpy.intp), minlength=self.n_conditions)
+        probabilities = counts[:self.n_conditions] / self.n_trials  # one pass instead of counting per condition
+        return probabilities.tolist()
 
     def response_summary(self):
         """
@@ -603,6 +747,7 @@ class Trialsequence(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOp
             axis (matplotlib.pyplot.Axes): plot axis to draw on, if none a new plot is generated
             show (bool): show the plot immediately, defaults to True
         """
+        plt = _get_plt()
         if plt is None:
             raise ImportError('Plotting requires matplotlib!')
         if axis is None:
@@ -613,6 +758,94 @@ class Trialsequence(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOp
             plt.show()
 
 
+def _simulate_staircases(start_val, threshold, slope, step_sizes, step_up_factor, step_type_code,
+                         n_up, n_down, n_reversals, min_val, max_val, n_pretrials, intensities, thresholds):
+    """
+    Run complete simulated staircases (the per-trial logic of Staircase plus a logistic observer) in one loop.
+    Written without Python objects so that numba can compile it to native code if installed; without numba it
+    runs as a regular (slower) Python function. `step_type_code` encodes the step type (0='db', 1='log', 2='lin').
+    `intensities` (n_runs x max_trials, filled with nan) and `thresholds` (n_runs) are output arrays; unfinished
+    runs keep nan as threshold. Called by `Staircase.simulate_batch`, which prepares the arguments.
+    """
+    n_runs, max_trials = intensities.shape
+    n_steps = step_sizes.shape[0]
+    for run in range(n_runs):
+        next_intensity = start_val
+        correct_counter = 0
+        direction_up = False  # staircases start in 'down' direction
+        n_rev = 0
+        finished = False
+        prev_result = -1  # -1 means no previous response
+        trial_n = -n_pretrials
+        n_recorded = 0
+        reversal_intensities = numpy.empty(n_reversals)
+        while not finished and n_recorded < max_trials:
+            trial_n += 1
+            intensity = next_intensity
+            intensities[run, n_recorded] = intensity
+            n_recorded += 1
+            hitrate = 1.0 / (1.0 + numpy.exp(4.0 * slope * (threshold - intensity)))
+            result = numpy.random.random() < hitrate
+            if intensity <= min_val:  # always record False at the lower limit, as add_response does
+                result = False
+            if trial_n > 0:  # out of the pretrials
+                if result:
+                    correct_counter = correct_counter + 1 if prev_result == 1 else 1
+                else:
+                    correct_counter = correct_counter - 1 if prev_result == 0 else -1
+                if n_rev == 0:  # no reversals yet, direction flips with every response change
+                    reversal = direction_up if result else not direction_up
+                    direction_up = not result
+                elif correct_counter >= n_down:
+                    reversal = direction_up
+                    direction_up = False
+                elif correct_counter <= -n_up:
+                    reversal = not direction_up
+                    direction_up = True
+                else:
+                    reversal = False
+                if reversal:
+                    reversal_intensities[n_rev] = intensity
+                    n_rev += 1
+                if n_rev >= n_reversals:
+                    finished = True
+                step = step_sizes[n_rev if n_rev < n_steps else n_steps - 1]
+                if direction_up:
+                    step *= step_up_factor
+                if (n_rev == 0 and result) or correct_counter >= n_down:  # going down
+                    if step_type_code == 0:
+                        next_intensity /= 10.0 ** (step / 20.0)
+                    elif step_type_code == 1:
+                        next_intensity /= 10.0 ** step
+                    else:
+                        next_intensity -= step
+                    if next_intensity < min_val:
+                        next_intensity = min_val
+                    correct_counter = 0
+                elif (n_rev == 0 and not result) or correct_counter <= -n_up:  # going up
+                    if step_type_code == 0:
+                        next_intensity *= 10.0 ** (step / 20.0)
+                    elif step_type_code == 1:
+                        next_intensity *= 10.0 ** step
+                    else:
+                        next_intensity += step
+                    if next_intensity > max_val:
+                        next_intensity = max_val
+                    correct_counter = 0
+            prev_result = 1 if result else 0
+        if finished:  # average the last n_reversals-1 reversals, like threshold()
+            n_avg = n_reversals - 1 if n_reversals > 1 else n_rev
+            acc = 0.0
+            for i in range(n_rev - n_avg, n_rev):
+                acc += reversal_intensities[i] if step_type_code == 2 else numpy.log(reversal_intensities[i])
+            acc /= n_avg
+            thresholds[run] = acc if step_type_code == 2 else numpy.exp(acc)
+
+
+if numba is not None:
+    _simulate_staircases = numba.njit(cache=True)(_simulate_staircases)
+
+
 class Staircase(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOptionsMixin):
     """
     Class to handle adaptive testing which means smoothly the selecting next trial, report current values and so on.
@@ -639,9 +872,9 @@ class Staircase(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOption
         label (str): text label for the sequence, defaults to an empty string
     Attributes:
         .this_trial_n: number of completed trials
-        .intensities: presented stimulus values
+        .intensities: numpy array of the presented stimulus values
         .current_direction: 'up' or 'down'
-        .data: list of responses
+        .data: numpy array of responses
         .reversal_points: indices of reversal trials
         .reversal_intensities: stimulus values at the reversals (used to compute threshold)
         .finished: True/False: have we finished yet?
@@ -662,7 +895,10 @@ class Staircase(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOption
         self.start_val = start_val
         self.n_up = n_up
         self.n_down = n_down
+        if step_type not in ('lin', 'db', 'log'):
+            raise ValueError(f'Unknown step_type parameter: {step_type}!')
         self.step_type = step_type
+        self._step_is_multiplicative = step_type in ('db', 'log')
         try:
             self.step_sizes = list(step_sizes)
         except TypeError:
@@ -670,6 +906,7 @@ class Staircase(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOption
         self._variable_step = True if len(self.step_sizes) > 1 else False
         self.step_up_factor = step_up_factor
         self.step_size_current = self.step_sizes[0]
+        self._update_step_factor()
         if n_reversals is None:
             if len(self.step_sizes) == 1:
                 self.n_reversals = 8  # if Staircase called without parameters, construct a short 8-reversal test
@@ -684,10 +921,15 @@ class Staircase(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOption
         self.finished = False
         self.n_pretrials = n_pretrials
         self.this_trial_n = -n_pretrials
-        self.data = []
-        self.intensities = []
+        # intensities and responses are kept in preallocated numpy buffers (grown geometrically when full)
+        # instead of Python lists, so that threshold, plot and _psychometric_function work on them directly
+        self._intensity_buf = numpy.zeros(64)
+        self._data_buf = numpy.zeros(64, dtype=bool)
+        self._n_intensities = 0
+        self._n_responses = 0
         self.reversal_points = []
         self.reversal_intensities = []
+        self._n_reversals_seen = 0  # running count, avoids len(reversal_intensities) calls in the per-trial path
         self.current_direction = 'down'
         self.correct_counter = 0
         self._next_intensity = self.start_val
@@ -697,6 +939,39 @@ class Staircase(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOption
         self.pf_percent_correct = None  # psychometric function, auto set when finished
         self.pf_responses_per_intensity = None  # psychometric function, auto set when finished
 
+    intensities = property(fget=lambda self: self._intensity_buf[:self._n_intensities],
+                           doc='The stimulus values presented so far.')
+    data = property(fget=lambda self: self._data_buf[:self._n_responses],
+                    doc='The responses recorded so far.')
+
+    def _grow_buffers(self):
+        """ Double the capacity of the intensity and response buffers. """
+        self._intensity_buf = numpy.resize(self._intensity_buf, len(self._intensity_buf) * 2)
+        self._data_buf = numpy.resize(self._data_buf, len(self._data_buf) * 2)
+
+    def _after_load(self):
+        """ Rebuild the intensity and response buffers after deserialization: JSON and msgpack restore them
+        as plain lists, and files saved by older slab versions store intensities/data as lists in the object
+        dict, where the class-level properties of the same name would shadow them. """
+        if '_intensity_buf' in self.__dict__:
+            self._intensity_buf = numpy.asarray(self._intensity_buf, dtype=numpy.float64)
+            self._data_buf = numpy.asarray(self._data_buf, dtype=bool)
+        else:  # file from an older version, move the plain lists into the buffers
+            intensities = self.__dict__.pop('intensities', [])
+            data = self.__dict__.pop('data', [])
+            size = max(64, len(intensities), len(data))
+            self._intensity_buf = numpy.zeros(size)
+            self._intensity_buf[:len(intensities)] = intensities
+            self._data_buf = numpy.zeros(size, dtype=bool)
+            self._data_buf[:len(data)] = data
+            self._n_intensities = len(intensities)
+            self._n_responses = len(data)
+        if '_n_reversals_seen' not in self.__dict__:  # derived attributes older files do not contain
+            self._n_reversals_seen = len(self.reversal_intensities)
+        if '_step_is_multiplicative' not in self.__dict__:
+            self._step_is_multiplicative = self.step_type in ('db', 'log')
+            self._update_step_factor()
+
     def __next__(self):
         """
         Is called when iterating trough a sequenceAdvances to next trial and returns it. Updates attributes
@@ -708,7 +983,10 @@ class Staircase(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOption
         """
         if not self.finished:
             self.this_trial_n += 1  # update pointer for next trial
-            self.intensities.append(self._next_intensity)
+            if self._n_intensities == len(self._intensity_buf):
+                self._grow_buffers()
+            self._intensity_buf[self._n_intensities] = self._next_intensity
+            self._n_intensities += 1
             return self._next_intensity
         else:
             self._psychometric_function()  # tally responses to create a psychometric function
@@ -734,57 +1012,61 @@ class Staircase(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOption
             result = False
         else:
             result = bool(result)
-        self.data.append(result)
-        if intensity is not None:
-            self.intensities.pop()
-            self.intensities.append(intensity)
+        if self._n_responses == len(self._data_buf):
+            self._grow_buffers()
+        self._data_buf[self._n_responses] = result
+        self._n_responses += 1
+        if intensity is not None:  # replace the recorded intensity with the one actually used
+            self._intensity_buf[self._n_intensities - 1] = intensity
         if self.this_trial_n > 0:  # we're out of the pretrials
             if result:  # correct response
-                if len(self.data) > 1 and self.data[-2] == result:
+                if self._n_responses > 1 and bool(self._data_buf[self._n_responses - 2]) == result:
                     self.correct_counter += 1  # increment if on a run
                 else:
                     self.correct_counter = 1  # or reset
             else:  # incorrect response
-                if len(self.data) > 1 and self.data[-2] == result:
+                if self._n_responses > 1 and bool(self._data_buf[self._n_responses - 2]) == result:
                     self.correct_counter -= 1  # decrement if on a run
                 else:
                     self.correct_counter = -1  # or reset
-            self.calculate_next_intensity()
+            self._advance(result)
 
     def calculate_next_intensity(self):
         """ Based on current intensity, counter of correct responses, and current direction. """
-        # TODO: description of how the current intensity is calculated
-        if not self.reversal_intensities:  # no reversals yet
-            if self.data[-1] is True:  # last answer correct
-                reversal = bool(self.current_direction == 'up')  # got it right
-                self.current_direction = 'down'
-            else:  # got it wrong
-                reversal = bool(self.current_direction == 'down')
-                self.current_direction = 'up'
+        self._advance(bool(self.data[-1]))
+
+    def _advance(self, result):
+        """ Fused per-trial update: decide the step direction, record a reversal, progress the step size and
+        apply the intensity change in one pass, so each condition is tested only once per response. The
+        response counter is updated by `add_response` before this is called. """
+        if self._n_reversals_seen == 0:  # no reversals yet, every response steps in its own direction
+            step_down = result
         elif self.correct_counter >= self.n_down:  # n right, time to go down!
-            reversal = bool(self.current_direction != 'down')
-            self.current_direction = 'down'
+            step_down = True
         elif self.correct_counter <= -self.n_up:  # n wrong, time to go up!
-            reversal = bool(self.current_direction != 'up')
-            self.current_direction = 'up'
+            step_down = False
         else:  # same as previous trial
-            reversal = False
-        if reversal:  # add reversal info
-            self.reversal_points.append(self.this_trial_n)
-            self.reversal_intensities.append(self.intensities[-1])
-        if len(self.reversal_intensities) >= self.n_reversals:
-            self.finished = True  # we're done
-        # if reversal and self._variable_step:  # new step size if necessary
+            step_down = None
+        if step_down is not None:
+            new_direction = 'down' if step_down else 'up'
+            if self.current_direction != new_direction:  # add reversal info
+                self.current_direction = new_direction
+                self.reversal_points.append(self.this_trial_n)
+                self.reversal_intensities.append(self.intensities[-1])
+                self._n_reversals_seen += 1
+                if self._n_reversals_seen >= self.n_reversals:
+                    self.finished = True  # we're done
             # if beyond the list of step sizes, use the last one
-        if len(self.reversal_intensities) >= len(self.step_sizes):
-            self.step_size_current = self.step_sizes[-1]
-        else:
-            _sz = len(self.reversal_intensities)
-            self.step_size_current = self.step_sizes[_sz]
-        if self.current_direction == 'up':
-            self.step_size_current *= self.step_up_factor  # apply factor for weighted up/down method
-        if not self.reversal_intensities:
-            if self.data[-1] == 1:
+            step_size = self.step_sizes[min(self._n_reversals_seen, len(self.step_sizes) - 1)]
+            if not step_down:
+                step_size *= self.step_up_factor  # apply factor for weighted up/down method
+            if step_size != self.step_size_current:
+                self.step_size_current = step_size
+                self._update_step_factor()  # recompute the cached power only when the step size changed
+        # note: the response that caused the first reversal only changes the intensity if the counter
+        # already passed a threshold, so the dispatch below re-checks against the updated reversal count
+        if self._n_reversals_seen == 0:
+            if result:
                 self._intensity_dec()
             else:
                 self._intensity_inc()
@@ -793,13 +1075,21 @@ class Staircase(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOption
         elif self.correct_counter <= -self.n_up:
             self._intensity_inc()  # n wrong, so going up
 
-    def _intensity_inc(self):
-        """ increment the current intensity and reset counter. """
+    def _update_step_factor(self):
+        """ Cache the multiplicative step factor for 'db' and 'log' staircases, so that the power is only
+        computed when the step size changes (at reversals) instead of on every trial. """
         if self.step_type == 'db':
-            self._next_intensity *= 10.0**(self.step_size_current/20.0)
+            self._step_factor = 10.0**(self.step_size_current/20.0)
         elif self.step_type == 'log':
-            self._next_intensity *= 10.0**self.step_size_current
-        elif self.step_type == 'lin':
+            self._step_factor = 10.0**self.step_size_current
+        else:  # 'lin' steps are additive, no factor needed
+            self._step_factor = None
+
+    def _intensity_inc(self):
+        """ increment the current intensity and reset counter. """
+        if self._step_is_multiplicative:  # 'db' or 'log'
+            self._next_intensity *= self._step_factor
+        else:  # 'lin'
             self._next_intensity += self.step_size_current
         if (self.max_val is not None) and (self._next_intensity > self.max_val):
             self._next_intensity = self.max_val  # check we haven't gone out of the legal range
@@ -807,11 +1097,9 @@ class Staircase(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOption
 
     def _intensity_dec(self):
         """ decrement the current intensity and reset counter. """
-        if self.step_type == 'db':
-            self._next_intensity /= 10.0**(self.step_size_current/20.0)
-        if self.step_type == 'log':
-            self._next_intensity /= 10.0**self.step_size_current
-        elif self.step_type == 'lin':
+        if self._step_is_multiplicative:  # 'db' or 'log'
+            self._next_intensity /= self._step_factor
+        else:  # 'lin'
             self._next_intensity -= self.step_size_current
         self.correct_counter = 0
         if (self.min_val is not None) and (self._next_intensity < self.min_val):
@@ -829,17 +1117,52 @@ class Staircase(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOption
         if self.finished:
             if n == 0 or n > self.n_reversals:
                 n = int(self.n_reversals) - 1
+            tail = self.reversal_intensities[-n:]  # cheaper in plain math than building numpy arrays for ~6 values
             if self.step_type == 'lin':
-                return numpy.mean(self.reversal_intensities[-n:])
-            return numpy.exp(numpy.mean(numpy.log(self.reversal_intensities[-n:])))
+                return math.fsum(tail) / len(tail)
+            return math.exp(math.fsum(math.log(intensity) for intensity in tail) / len(tail))
         return None  # still running the staircase
 
+    def simulate_batch(self, threshold, n_runs=100, transition_width=2, max_trials=1000):
+        """
+        Run many simulated staircases with the parameters of this one against a logistic observer, for
+        Monte Carlo validation of a staircase design. The per-trial logic matches iterating a Staircase
+        and feeding it `simulate_response` values, but runs in a single loop over plain arrays which the
+        optional numba module compiles to native code (orders of magnitude faster for large batches).
+
+        Arguments:
+            threshold (int | float): true threshold of the simulated observer (midpoint of the psychometric
+                function, as in `simulate_response`).
+            n_runs (int): number of simulated staircases.
+            transition_width (int | float): range over which the observer's hitrate increases from 0.25 to 0.75.
+            max_trials (int): hard limit on the number of trials per run, in case a staircase fails to converge.
+        Returns:
+            (tuple of numpy.ndarray): array of shape (n_runs, max_trials) with the presented intensities
+            (nan-padded after each staircase finished), and array of length n_runs with the threshold
+            estimate of each run (nan for runs that did not finish within max_trials).
+        Example::
+
+            stairs = Staircase(start_val=10, n_reversals=18, step_sizes=[4, 1])
+            intensities, thresholds = stairs.simulate_batch(threshold=3, n_runs=1000)
+            print(f'mean threshold estimate: {numpy.nanmean(thresholds)}')
+        """
+        step_type_code = ('db', 'log', 'lin').index(self.step_type)
+        min_val = -numpy.inf if self.min_val is None else float(self.min_val)
+        max_val = numpy.inf if self.max_val is None else float(self.max_val)
+        intensities = numpy.full((n_runs, max_trials), numpy.nan)
+        thresholds = numpy.full(n_runs, numpy.nan)
+        _simulate_staircases(float(self.start_val), float(threshold), 0.5 / transition_width,
+                             numpy.asarray(self.step_sizes, dtype=numpy.float64), float(self.step_up_factor),
+                             step_type_code, self.n_up, self.n_down, self.n_reversals, min_val,
+                             max_val, self.n_pretrials, intensities, thresholds)
+        return intensities, thresholds
+
     def print_trial_info(self):
         """ Convenience method for printing current trial information. s """
         print(
             f'{self.label} | trial # {self.this_trial_n}: reversals: {len(self.reversal_points)}/{self.n_reversals},'
-            f' intensity {round(self.intensities[-1],2) if self.intensities else round(self._next_intensity,2)},'
-            f' going {self.current_direction}, response {self.data[-1] if self.data else None}')
+            f' intensity {round(self.intensities[-1],2) if self._n_intensities else round(self._next_intensity,2)},'
+            f' going {self.current_direction}, response {self.data[-1] if self._n_responses else None}')
 
     def save_csv(self, filename):
         """
@@ -852,15 +1175,9 @@ class Staircase(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOption
         """
         if self.this_trial_n < 1:
             return False  # no trials to save
-        with open(filename, 'w') as f:
-            raw_intensities = str(self.intensities)
-            raw_intensities = raw_intensities.replace('[', '').replace(']', '')
-            f.write(raw_intensities)
-            f.write('\n')
-            responses = str(numpy.multiply(self.data, 1))  # convert to 0 / 1
-            responses = responses.replace('[', '').replace(']', '')
-            responses = responses.replace(' ', ', ')
-            f.write(responses)
+        with open(filename, 'w') as f:  # format each row directly into the stream, no intermediate strings
+            numpy.savetxt(f, self.intensities[None, :], fmt='%.8g', delimiter=', ')
+            numpy.savetxt(f, numpy.asarray(self.data, dtype=numpy.int8)[None, :], fmt='%d', delimiter=', ')
         return True
 
     def plot(self, axis=None, show=True):
@@ -871,12 +1188,13 @@ class Staircase(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOption
             axis (matplotlib.pyplot.Axes): plot axis to draw on, if none a new plot is generated
             show (bool): whether to show the plot right after drawing.
         """
+        plt = _get_plt()
         if plt is None:
             raise ImportError('Plotting requires matplotlib!')
-        if self.intensities:  # plotting only after first response
-            x = numpy.arange(-self.n_pretrials, len(self.intensities)-self.n_pretrials)
-            y = numpy.array(self.intensities)  # all previously played intensities
-            responses = numpy.array(self.data)
+        if self._n_intensities:  # plotting only after first response
+            x = numpy.arange(-self.n_pretrials, self._n_intensities-self.n_pretrials)
+            y = self.intensities  # all previously played intensities
+            responses = self.data
             if axis is None:
                 fig = plt.figure('stairs')  # figure 'stairs' is created or made current
                 axis = fig.gca()
@@ -885,10 +1203,12 @@ class Staircase(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOption
             axis.set_xlim(-self.n_pretrials, max(20, (self.this_trial_n + 15)//10*10))
             axis.set_ylim(min(0, min(y)) if self.min_val == -numpy.Inf else self.min_val,
                           max(y) if self.max_val == numpy.Inf else self.max_val)
+            correct = numpy.flatnonzero(responses)  # integer indices, computed once instead of masking twice
+            incorrect = numpy.flatnonzero(~responses)
             # plot green dots at correct/yes responses
-            axis.scatter(x[responses], y[responses], color='green')
-            # plot red dots at correct/yes responses
-            axis.scatter(x[~responses], y[~responses], color='red')
+            axis.scatter(x[correct], y[correct], color='green')
+            # plot red dots at incorrect/no responses
+            axis.scatter(x[incorrect], y[incorrect], color='red')
             axis.scatter(len(self.intensities)-self.n_pretrials+1, self._next_intensity, color='grey')  # current trial
             axis.set_ylabel('Dependent variable')
             axis.set_xlabel('Trial')
@@ -902,6 +1222,7 @@ class Staircase(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOption
     @staticmethod
     def close_plot():
         """ Closes a staircase plot (if not drawn into a specified axis) - used for plotting after each trial. """
+        plt = _get_plt()
         plt.close('stairs')
 
     def _psychometric_function(self):
@@ -911,21 +1232,15 @@ class Staircase(collections.abc.Iterator, LoadSaveMixin, TrialPresentationOption
         where each is the center of an intensity bin), `pf_percent_correct` (array of mean percent correct in each bin),
         `pf_responses_per_intensity` (array of number of responses contributing to each mean).
         """
-        intensities = numpy.array(self.intensities)
-        responses = numpy.array(self.data)
-        binned_resp = []
-        binned_intensities = []
-        n_points = []
-        intensities = numpy.round(intensities, decimals=8)
-        unique_intensities = numpy.unique(intensities)
-        for this_intensity in unique_intensities:
-            these_responses = responses[intensities == this_intensity]
-            binned_intensities.append(this_intensity)
-            binned_resp.append(numpy.mean(these_responses))
-            n_points.append(len(these_responses))
-        self.pf_intensities = binned_intensities
-        self.pf_percent_correct = binned_resp
-        self.pf_responses_per_intensity = n_points
+        intensities = numpy.round(self.intensities, decimals=8)
+        responses = numpy.asarray(self.data, dtype=float)
+        # group responses by intensity in one pass instead of masking the response array per unique intensity
+        unique_intensities, inverse = numpy.unique(intensities, return_inverse=True)
+        n_points = numpy.bincount(inverse)
+        binned_resp = numpy.bincount(inverse, weights=responses) / n_points
+        self.pf_intensities = unique_intensities.tolist()
+        self.pf_percent_correct = binned_resp.tolist()
+        self.pf_responses_per_intensity = n_points.tolist()
 
 
 class ResultsFile:
@@ -977,7 +1292,7 @@ class ResultsFile:
         if tag is None or tag == 'time':
             tag = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
         with open(self.path, 'a') as file:
-            file.write(json.dumps({tag: data}))
+            file.write(json.dumps({tag: data}, default=_json_default))
             file.write('\n')
 
     @staticmethod
@@ -1086,7 +1401,7 @@ class Precomputed(list):
             previous = None
         idx = previous
         while idx == previous:
-            idx = numpy.random.randint(len(self))
+            idx = _rng.integers(len(self))
         self.sequence.append(idx) # add to the list of played stimuli
         self[idx].play()
 
@@ -1099,7 +1414,7 @@ class Precomputed(list):
         Returns:
             (list): list of n random elements.
         """
-        idxs = numpy.random.randint(0, len(self), size=n)
+        idxs = _rng.integers(0, len(self), size=n)
         return [self[i] for i in idxs]
 
     def write(self, filename):
@@ -2,6 +2,7 @@ import slab
 from itertools import zip_longest
 import tempfile
 import numpy
+import pytest
 from matplotlib import pyplot as plt
 import random
 from pathlib import Path
@@ -98,6 +99,56 @@ def test_staircase():  # this seems to block
     stairs.save_csv(PATH / "staircase.csv")
 
 
+def test_simulate_batch():
+    stairs = slab.Staircase(start_val=10, n_reversals=18, step_sizes=[4, 1])
+    intensities, thresholds = stairs.simulate_batch(threshold=3, n_runs=50)
+    assert intensities.shape == (50, 1000)
+    assert thresholds.shape == (50,)
+    assert abs(numpy.nanmean(thresholds) - 3) < 2
+    stairs = slab.Staircase(start_val=40, n_reversals=18, step_sizes=[8, 2], step_type="db",
+                            min_val=None, max_val=None)  # None bounds must be treated as unbounded
+    intensities, thresholds = stairs.simulate_batch(threshold=20, n_runs=50)
+    assert numpy.isfinite(thresholds).all()
+    assert abs(numpy.nanmean(thresholds) - 20) < 5
+
+
+def test_serialization():
+    # JSON round-trip of a running staircase with default (infinite) bounds
+    stairs = slab.Staircase(start_val=10, n_reversals=18, step_sizes=[4, 1])
+    for _ in range(5):
+        next(stairs)
+        stairs.add_response(stairs.simulate_response(threshold=3))
+    stairs.save_json(PATH / "staircase.json")
+    loaded = slab.Staircase(start_val=0)
+    loaded.load_json(PATH / "staircase.json")
+    assert loaded.min_val == -numpy.inf and loaded.max_val == numpy.inf
+    assert list(loaded.intensities) == list(stairs.intensities)
+    assert list(loaded.data) == list(stairs.data)
+    for stimulus_value in loaded:  # resume the staircase from the loaded state
+        loaded.add_response(loaded.simulate_response(threshold=3))
+    assert loaded.finished
+    loaded.save_csv(PATH / "staircase_loaded.csv")
+
+
+def test_serialization_msgpack():
+    pytest.importorskip("msgpack")  # optional dependency, not part of the testing extra
+    # msgpack round-trip of a partially run trial sequence
+    sequence = slab.Trialsequence(conditions=["a", "b", "c"], n_reps=3)
+    for _ in range(4):
+        next(sequence)
+        sequence.add_response(1)
+    sequence.save_msgpack(PATH / "sequence.msgpack")
+    loaded = slab.Trialsequence(conditions=2)
+    loaded.load_msgpack(PATH / "sequence.msgpack")
+    assert loaded.conditions == sequence.conditions
+    assert list(loaded.trials) == list(sequence.trials)
+    assert loaded.this_n == sequence.this_n
+    remaining = [trial for trial in loaded]  # resume iterating where the saved sequence stopped
+    assert len(remaining) == sequence.n_trials - sequence.this_n - 1
+    assert all(trial == loaded.conditions[loaded.trials[i + sequence.this_n + 1] - 1]
+               for i, trial in enumerate(remaining))
+
+
 def test_precomputed():
     sounds = [slab.Sound.whitenoise() for _ in range(10)]
     sounds = slab.Precomputed(sounds)